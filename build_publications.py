@@ -1,20 +1,34 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import functools
 import html
+import operator
 import re
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import date, datetime
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Iterable, Iterator, Optional
 
 import bibtexparser
-from bibtexparser.bparser import BibTexParser
-from pylatexenc.latex2text import LatexNodes2Text
+from bibtexparser.middlewares import NormalizeFieldKeys
+from pylatexenc.latex2text import LatexNodes2Text, get_default_latex_context_db
 
-_LATEX = LatexNodes2Text()
+from nrg_bib.util import _bib_fields, _clean, _failed_blocks, _first_doi, _normalize_pages, _parse_year
 
-DOI_RE = re.compile(r"10\.\d{4,9}/[^\s\"<>]+", re.I)
+# BibTeX fields only need accents, symbols and simple formatting macros;
+# "latex-approximations" carries \emph and friends, "advanced-symbols" the
+# Cyrillic letters Zotero emits (\cyrchar\cyryo).
+_LATEX_CONTEXT = get_default_latex_context_db().filter_context(
+    keep_categories=["latex-base", "latex-approximations", "nonascii-specials", "advanced-symbols"]
+)
+_LATEX = LatexNodes2Text(latex_context=_LATEX_CONTEXT, math_mode="text", strict_latex_spaces=False)
+
+_DATE_YMD_RE = re.compile(r"^\s*(\d{4})-(\d{2})-(\d{2})")
+_DATE_YM_RE = re.compile(r"^\s*(\d{4})-(\d{2})")
+_WS_RE = re.compile(r"\s+")
+_SPLIT_NAME_RE = re.compile(r"[\s\-]+")
+_PREPRINT_RE = re.compile(r"preprintdoi\s*:\s*(10\.\d{4,9}/[^\s,;]+)", re.I)
 
 def _latex_to_text(s: str | None) -> str:
     """
@@ -26,7 +40,11 @@ def _latex_to_text(s: str | None) -> str:
     s = _clean(s)
     if not s:
         return ""
+    return _latex_to_text_cached(s)
+
 
+@functools.lru_cache(maxsize=4096)
+def _latex_to_text_cached(s: str) -> str:
     # bibtex often wraps bits in { ... } to preserve capitalization
     # pylatexenc handles most, but we also remove stray braces after conversion.
     try:
@@ -37,25 +55,24 @@ def _latex_to_text(s: str | None) -> str:
     # remove lingering braces that sometimes survive
     txt = txt.replace("{", "").replace("}", "")
     # collapse excessive whitespace
-    txt = re.sub(r"\s+", " ", txt).strip()
+    txt = _WS_RE.sub(" ", txt).strip()
     return txt
 
-def _clean(s: str | None) -> str:
-    return (s or "").strip()
-
-
-def _first_doi(s: str | None) -> str | None:
-    s = _clean(s)
-    if not s:
-        return None
-    m = DOI_RE.search(s)
-    return m.group(0) if m else None
-
 
-def _parse_year(s: str | None) -> int:
-    s = _clean(s)
-    m = re.search(r"\b(19|20)\d{2}\b", s)
-    return int(m.group(0)) if m else 0
+_MONTH_MAP: dict[str, int] = {
+    "jan": 1, "january": 1,
+    "feb": 2, "february": 2,
+    "mar": 3, "march": 3,
+    "apr": 4, "april": 4,
+    "may": 5,
+    "jun": 6, "june": 6,
+    "jul": 7, "july": 7,
+    "aug": 8, "august": 8,
+    "sep": 9, "september": 9,
+    "oct": 10, "october": 10,
+    "nov": 11, "november": 11,
+    "dec": 12, "december": 12,
+}
 
 
 def _parse_date(entry: dict[str, Any]) -> Optional[date]:
@@ -68,12 +85,12 @@ def _parse_date(entry: dict[str, Any]) -> Optional[date]:
     d = _clean(entry.get("date"))
     if d:
         # keep only leading YYYY-MM-DD if present
-        m = re.match(r"^\s*(\d{4})-(\d{2})-(\d{2})", d)
+        m = _DATE_YMD_RE.match(d)
         if m:
             y, mo, da = map(int, m.groups())
             return date(y, mo, da)
         # sometimes just YYYY-MM
-        m = re.match(r"^\s*(\d{4})-(\d{2})", d)
+        m = _DATE_YM_RE.match(d)
         if m:
             y, mo = map(int, m.groups())
             return date(y, mo, 1)
@@ -85,27 +102,12 @@ def _parse_date(entry: dict[str, Any]) -> Optional[date]:
     month_raw = _clean(entry.get("month"))
     day_raw = _clean(entry.get("day"))
 
-    month_map = {
-        "jan": 1, "january": 1,
-        "feb": 2, "february": 2,
-        "mar": 3, "march": 3,
-        "apr": 4, "april": 4,
-        "may": 5,
-        "jun": 6, "june": 6,
-        "jul": 7, "july": 7,
-        "aug": 8, "august": 8,
-        "sep": 9, "september": 9,
-        "oct": 10, "october": 10,
-        "nov": 11, "november": 11,
-        "dec": 12, "december": 12,
-    }
-
     mo = 1
     if month_raw:
         if month_raw.isdigit():
             mo = max(1, min(12, int(month_raw)))
         else:
-            mo = month_map.get(month_raw.lower().strip("."), 1)
+            mo = _MONTH_MAP.get(month_raw.casefold().strip("."), 1)
 
     da = 1
     if day_raw and day_raw.isdigit():
@@ -113,23 +115,32 @@ def _parse_date(entry: dict[str, Any]) -> Optional[date]:
 
     return date(y, mo, da)
 
-def _normalize_pages(pages: str) -> str:
-    pages = _clean(pages)
-    if not pages:
-        return ""
-    # BibTeX page ranges use double hyphen
-    return pages.replace("--", "-")
-    # If you prefer en dash: return pages.replace("--", "–")
-
 def _split_authors(author_field: str) -> list[str]:
     return [a.strip().strip(",") for a in author_field.split(" and ") if a.strip()]
 
 
+# characters (and ligature pairs below) that make LaTeX decoding non-trivial
+_LATEX_CHARSET = frozenset("\\{}$%~^_&#`")
+
+
+def _is_plain_text(s: str) -> bool:
+    """
+    True when s is ASCII with no LaTeX markup, so _latex_to_text would only
+    normalise whitespace.
+    """
+    return s.isascii() and _LATEX_CHARSET.isdisjoint(s) and "--" not in s and "''" not in s
+
+
+@functools.lru_cache(maxsize=4096)
 def _format_one_author(name: str) -> str:
     """
     Convert "Last, First Middle" or "First Middle Last" -> "Last, F. M."
     """
-    name = _latex_to_text(name).strip().strip(",")
+    if _is_plain_text(name):
+        # nothing for LaTeX to decode; just normalise whitespace
+        name = " ".join(name.split()).strip(",")
+    else:
+        name = _latex_to_text(name).strip().strip(",")
     if not name:
         return ""
 
@@ -143,7 +154,7 @@ def _format_one_author(name: str) -> str:
         given = " ".join(bits[:-1])
 
     initials: list[str] = []
-    for tok in re.split(r"[\s\-]+", given):
+    for tok in _SPLIT_NAME_RE.split(given):
         tok = tok.strip().strip(".").strip(",")
         if not tok:
             continue
@@ -171,6 +182,18 @@ def _format_author_list(author_field: str) -> str:
     return "; ".join(authors[:-1]) + " and " + authors[-1]
 
 
+_HTML_SPECIALS = frozenset("&<>\"'")
+
+
+def _escape(s: str) -> str:
+    """
+    html.escape, skipped for the common case of text with nothing to escape.
+    """
+    if _HTML_SPECIALS.isdisjoint(s):
+        return s
+    return html.escape(s)
+
+
 def _doi_href(doi: str, url: str | None) -> str:
     """
     If url looks like a DOI landing page and contains the DOI, prefer it (e.g., Science).
@@ -183,8 +206,8 @@ def _doi_href(doi: str, url: str | None) -> str:
 
 
 def _doi_anchor(doi: str, href: str) -> str:
-    doi = html.escape(doi)
-    href = html.escape(href, quote=True)
+    doi = _escape(doi)
+    href = _escape(href)
     return f'<a href="{href}">{doi}</a>'
 
 def _extract_preprint_doi(entry: dict[str, Any]) -> str | None:
@@ -203,7 +226,7 @@ def _extract_preprint_doi(entry: dict[str, Any]) -> str | None:
         return None
 
     # Look for preprint_doi:10....
-    m = re.search(r"preprintdoi\s*:\s*(10\.\d{4,9}/[^\s,;]+)", annotation, re.I)
+    m = _PREPRINT_RE.search(annotation)
     if m:
         return m.group(1)
 
@@ -228,7 +251,7 @@ def _infer_journal(entry: dict[str, Any], doi: str | None) -> str:
 
     return ""
 
-@dataclass
+@dataclass(slots=True)
 class Entry:
     indx: int
     key: str
@@ -243,6 +266,14 @@ class Entry:
     doi_url: str | None
     preprint_doi: str | None
     published_date: Optional[date]
+    # precomputed once so sorting only compares tuples
+    _sort_key: tuple[date, int] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # newest first: use full date if available; else Jan 1 of year; else very old
+        d = self.published_date or (date(self.year, 1, 1) if self.year else date(1900, 1, 1))
+        # self._sort_key = (d, self.title.lower())
+        self._sort_key = (d, self.indx)
 
     @staticmethod
     def from_bib(e: dict[str, Any], idx:int) -> "Entry":
@@ -267,11 +298,8 @@ class Entry:
             published_date=published_date,
         )
 
-    def sort_key(self):
-        # newest first: use full date if available; else Jan 1 of year; else very old
-        d = self.published_date or (date(self.year, 1, 1) if self.year else date(1900, 1, 1))
-        # return (d, self.title.lower())
-        return (d, self.indx)
+    def sort_key(self) -> tuple[date, int]:
+        return self._sort_key
 
     def render_html_entry(self) -> str:
         """
@@ -280,43 +308,42 @@ class Entry:
         Pattern:
         Authors. Title <em> Journal</em>, <strong>YEAR</strong>, <em>VOLUME,</em> PAGES, DOI: <a href="...">DOI</a> (For the preprint version, see <a ...>DOI</a>)
         """
-        authors = _latex_to_text(_format_author_list(self.author))
-        title = html.escape(_latex_to_text(self.title))
-        journal = html.escape(_latex_to_text(self.journal))
+        authors = _format_author_list(self.author)
+        title = _escape(_latex_to_text(self.title))
+        journal = _escape(_latex_to_text(self.journal))
 
         year = str(self.year) if self.year else ""
-        volume = html.escape(self.volume)
-        pages = html.escape(_normalize_pages(self.pages))
+        volume = _escape(self.volume)
+        pages = _escape(_normalize_pages(self.pages))
 
-        parts: list[str] = []
+        # Each segment carries its own trailing punctuation, so a plain
+        # space join yields canonical spacing without any cleanup pass.
+        segments: list[str] = []
         if authors:
-            parts.append(f"{html.escape(authors)}")
+            segments.append(_escape(authors))
         if title:
-            parts.append(title)
+            segments.append(title)
 
         # Journal is italic, with a leading space INSIDE <em> to match examples: <em> Matter</em>
         if journal:
-            parts.append(f"<em> {journal}</em>,")
+            segments.append(f"<em> {journal}</em>,")
         if year:
-            parts.append(f"<strong>{html.escape(year)}</strong>, ")
+            segments.append(f"<strong>{year}</strong>,")
 
         # volume in italics with trailing comma inside the <em> tag: <em>7,</em>
         if volume:
-            parts.append(f"<em>{volume}, </em>")
+            segments.append(f"<em>{volume},</em>")
 
         # pages are plain, followed by comma
         if pages:
-            parts.append(f"{pages}, ")
+            segments.append(f"{pages},")
 
         # DOI block
         if self.doi:
             href = _doi_href(self.doi, self.doi_url)
-            parts.append(f"DOI: {_doi_anchor(self.doi, href)}")
+            segments.append(f"DOI: {_doi_anchor(self.doi, href)}")
 
-        # Join with spaces, then clean comma spacing a bit
-        txt = " ".join([p for p in parts if p]).strip()
-        txt = re.sub(r"\s+,", ",", txt)  # avoid " ,"
-        txt = re.sub(r",\s*,", ",", txt)
+        txt = " ".join(segments)
 
         # Preprint note, exactly as your example
         if self.preprint_doi:
@@ -326,34 +353,54 @@ class Entry:
         return f'<div class="csl-entry">{txt}</div>'
 
 
-def load_entries(bib_path: Path) -> list[Entry]:
-    parser = BibTexParser(common_strings=True)
-    with bib_path.open("r", encoding="utf-8") as f:
-        db = bibtexparser.load(f, parser=parser)
-    return [Entry.from_bib(e, idx=i) for i, e in enumerate(db.entries)]
+def iter_entries(bib_path: Path) -> Iterator[Entry]:
+    """
+    Yield entries one at a time rather than building a second list alongside
+    the parsed library.
+    """
+    # default stack (string interpolation + brace removal) plus lowercase keys;
+    # no latex/name/month middlewares, we only read a handful of raw fields
+    library = bibtexparser.parse_file(
+        str(bib_path), append_middleware=[NormalizeFieldKeys()]
+    )
+    # a block that failed to parse would silently vanish from the website
+    failed = _failed_blocks(library)
+    if failed:
+        raise ValueError(f"{bib_path}: parser rejected {len(failed)} block(s):\n" + "\n".join(failed))
+    for i, e in enumerate(library.entries):
+        yield Entry.from_bib(_bib_fields(e), idx=i)
+
 
+def load_entries(bib_path: Path) -> list[Entry]:
+    return list(iter_entries(bib_path))
 
-def build_html(entries: list[Entry]) -> str:
-    # sort by date (newest first)
-    entries = sorted(entries, key=lambda e: e.sort_key(), reverse=True)
 
-    # group by year (descending)
+def build_html(entries: Iterable[Entry]) -> str:
+    # group by year, then sort each bucket by date (newest first); years are
+    # independent so there is no need for one global sort
     by_year: dict[int, list[Entry]] = {}
     for e in entries:
         if e.year:
             by_year.setdefault(e.year, []).append(e)
 
     years = sorted(by_year.keys(), reverse=True)
+    for y in years:
+        by_year[y].sort(key=operator.attrgetter("_sort_key"), reverse=True)
 
-    blocks: list[str] = []
-    blocks.append('<div class="csl-bib-body">')
+    # exact size is known up front: opening div, one heading per year, the
+    # entries themselves, closing div
+    blocks: list[str] = [""] * (2 + len(years) + sum(map(len, by_year.values())))
+    blocks[0] = '<div class="csl-bib-body">'
 
+    i = 1
     for y in years:
-        blocks.append(f'<h2 class="wpmgrouptitle">{y}</h2>')
+        blocks[i] = f'<h2 class="wpmgrouptitle">{y}</h2>'
+        i += 1
         for e in by_year[y]:
-            blocks.append(e.render_html_entry())
+            blocks[i] = e.render_html_entry()
+            i += 1
 
-    blocks.append("</div>")
+    blocks[i] = "</div>"
     return "\n".join(blocks)
 
 
@@ -362,8 +409,7 @@ def main() -> None:
     bib = root / "publications.bib"
     out = root / "publications.html"
 
-    entries = load_entries(bib)
-    html_out = build_html(entries)
+    html_out = build_html(iter_entries(bib))
 
     out.write_text(html_out + "\n", encoding="utf-8")
     print(f"Wrote {out}")
@@ -1,42 +1,97 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
-import re
+import hashlib
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import date
 from pathlib import Path
 from typing import Any
 
 import bibtexparser
+import orjson
 import requests
+from bibtexparser.middlewares import NormalizeFieldKeys
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-DOI_RE = re.compile(r"10\.\d{4,9}/[^\s\"<>]+", re.I)
+from nrg_bib.util import _bib_fields, _clean, _failed_blocks, _first_doi, _normalize_pages, _parse_year
 
+# Contact address for Crossref's "polite" pool; without one requests land in
+# the public pool, which has lower limits.
+_MAILTO = os.environ.get("CROSSREF_MAILTO", "").strip()
 
-def _clean(s: str | None) -> str:
-    return (s or "").strip()
+# Limits from the Crossref REST API documentation ("Rate limits"):
+#   polite pool: 3 concurrent requests, 10 req/s single works, 3 req/s lists
+#   public pool: 1 concurrent request,   5 req/s single works, 1 req/s lists
+# "lists" are /works?filter=... queries, i.e. the batched DOI lookups.
+if _MAILTO:
+    _MAX_WORKERS, _SINGLE_RATE, _LIST_RATE = 3, 10.0, 3.0
+else:
+    _MAX_WORKERS, _SINGLE_RATE, _LIST_RATE = 1, 5.0, 1.0
+# DOIs per /works?filter=doi:... request
+_BATCH_SIZE = 20
 
 
-def _first_doi(s: str | None) -> str | None:
-    s = _clean(s)
-    if not s:
-        return None
-    m = DOI_RE.search(s)
-    return m.group(0) if m else None
-
-
-def _parse_year(s: str | None) -> str:
-    s = _clean(s)
-    m = re.search(r"\b(19|20)\d{2}\b", s)
-    return m.group(0) if m else ""
-
-
-def _normalize_pages(p: str) -> str:
-    p = _clean(p)
-    return p.replace("--", "-") if p else ""
-
+class _Pacer:
+    """
+    Space calls at least 1/rate seconds apart, shared across worker threads.
+    """
 
-@dataclass
+    def __init__(self, rate: float) -> None:
+        self._interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self._interval
+        if start > now:
+            time.sleep(start - now)
+
+
+_SINGLE_PACER = _Pacer(_SINGLE_RATE)
+_LIST_PACER = _Pacer(_LIST_RATE)
+
+_SESSION = requests.Session()
+_SESSION.headers.update(
+    {
+        # Crossref asks for a UA that identifies you (set CROSSREF_MAILTO)
+        "User-Agent": "NRG-publications-metadata-watch/1.0"
+        + (f" (mailto:{_MAILTO})" if _MAILTO else ""),
+        "Accept": "application/json",
+    }
+)
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=_MAX_WORKERS,
+        pool_maxsize=_MAX_WORKERS,
+        # back off on rate limiting / transient errors; raise_on_status=False
+        # hands the final response back so the lookup code can apply its own
+        # handling (404 = unknown DOI, other errors = failed lookup)
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            raise_on_status=False,
+        ),
+    ),
+)
+
+# a lookup that raises one of these counts as failed, not as "no differences"
+_LOOKUP_ERRORS = (requests.RequestException, ValueError)
+
+# raw Crossref messages, keyed by sha1(doi), revalidated with ETag/Last-Modified
+_CACHE_DIR = Path(".cache") / "crossref"
+
+@dataclass(slots=True)
 class BibItem:
     key: str
     doi: str
@@ -50,15 +105,17 @@ class BibItem:
 
 
 def load_bib(path: Path) -> list[BibItem]:
-    parser = bibtexparser.bparser.BibTexParser(common_strings=True)
-    with path.open("r", encoding="utf-8") as f:
-        db = bibtexparser.load(f, parser=parser)
+    library = bibtexparser.parse_file(str(path), append_middleware=[NormalizeFieldKeys()])
+    for desc in _failed_blocks(library):
+        print(f"warning: {path}: block rejected by the parser, not checked: {desc}", file=sys.stderr)
 
     items: list[BibItem] = []
-    for e in db.entries:
+    for block in library.entries:
+        e = _bib_fields(block)
         doi = _first_doi(e.get("doi"))
         if not doi:
             continue
+        year = _parse_year(e.get("year"))
 
         items.append(
             BibItem(
@@ -66,7 +123,7 @@ def load_bib(path: Path) -> list[BibItem]:
                 doi=doi,
                 title=_clean(e.get("title")),
                 journal=_clean(e.get("journal") or e.get("booktitle") or e.get("howpublished")),
-                year=_parse_year(e.get("year")),
+                year=str(year) if year else "",
                 volume=_clean(_normalize_pages(e.get("volume"))),
                 issue=_clean(e.get("number") or e.get("issue")),
                 pages=_normalize_pages(e.get("pages")),
@@ -76,20 +133,157 @@ def load_bib(path: Path) -> list[BibItem]:
     return items
 
 
-def crossref_lookup(doi: str) -> dict[str, Any] | None:
+def _cache_path(doi: str) -> Path:
+    digest = hashlib.sha1(doi.lower().encode("utf-8")).hexdigest()
+    return _CACHE_DIR / f"{digest}.json"
+
+
+def _read_cache(doi: str) -> dict[str, Any] | None:
+    try:
+        return orjson.loads(_cache_path(doi).read_bytes())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache(doi: str, etag: str, last_modified: str, message: dict[str, Any]) -> None:
+    path = _cache_path(doi)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {"etag": etag, "last_modified": last_modified, "message": message}
+    # write then rename so a concurrent reader never sees a partial file
+    tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+    tmp.write_bytes(orjson.dumps(payload))
+    tmp.replace(path)
+
+
+def crossref_lookup(doi: str, cached: dict[str, Any] | None = None) -> dict[str, Any] | None:
+    """
+    Look up one DOI. `cached` is its on-disk cache entry, already read by the
+    caller (lookup_all reads each file once to route the DOI).
+    """
     url = f"https://api.crossref.org/works/{doi}"
-    r = requests.get(
-        url,
+    headers: dict[str, str] = {}
+
+    # conditional GET: published metadata rarely changes, so most runs get a 304
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    _SINGLE_PACER.wait()
+    r = _SESSION.get(url, timeout=25, headers=headers)
+    if r.status_code == 304 and cached:
+        return cached.get("message") or None
+    if r.status_code == 404:
+        # not registered with Crossref; nothing to compare against
+        return None
+    r.raise_for_status()
+    data = orjson.loads(r.content)
+    msg = data.get("message") or None
+    if msg:
+        _write_cache(
+            doi,
+            r.headers.get("ETag", ""),
+            r.headers.get("Last-Modified", ""),
+            msg,
+        )
+    return msg
+
+
+def crossref_lookup_batch(dois: list[str]) -> dict[str, dict[str, Any]]:
+    """
+    Fetch several works in one /works?filter=doi:... request.
+    Returns messages keyed by lowercased DOI; DOIs Crossref did not return
+    are simply absent. A failed request raises rather than returning {}.
+    """
+    _LIST_PACER.wait()
+    r = _SESSION.get(
+        "https://api.crossref.org/works",
         timeout=25,
-        headers={
-            # Crossref asks for a UA that identifies you; replace email if you want
-            "User-Agent": "NRG-publications-metadata-watch/1.0 (mailto:your-email@example.com)"
-        },
+        params={"filter": ",".join(f"doi:{d}" for d in dois), "rows": len(dois)},
     )
-    if r.status_code != 200:
-        return None
-    data = r.json()
-    return data.get("message") or None
+    r.raise_for_status()
+    data = orjson.loads(r.content)
+    found: dict[str, dict[str, Any]] = {}
+    for work in (data.get("message") or {}).get("items") or []:
+        doi = _clean(work.get("DOI")).lower()
+        if doi:
+            found[doi] = work
+    return found
+
+
+def _lookup_chunk(dois: list[str]) -> tuple[dict[str, dict[str, Any] | None], list[str]]:
+    # a failed batch propagates: the caller marks the whole chunk as failed
+    # instead of retrying each DOI against a throttled API
+    msgs: dict[str, dict[str, Any] | None] = dict(crossref_lookup_batch(dois))
+    failed: list[str] = []
+    # the batch succeeded; look up singly only what it did not return
+    for doi in dois:
+        if doi.lower() in msgs:
+            continue
+        try:
+            # batched DOIs had no revalidatable cache entry, so nothing to pass
+            msgs[doi.lower()] = crossref_lookup(doi)
+        except _LOOKUP_ERRORS:
+            failed.append(doi)
+    return msgs, failed
+
+
+def _has_validators(cached: dict[str, Any] | None) -> bool:
+    return bool(cached and (cached.get("etag") or cached.get("last_modified")))
+
+
+def lookup_all(dois: list[str]) -> tuple[dict[str, dict[str, Any] | None], list[str]]:
+    """
+    Look up every DOI. Returns messages keyed by lowercased DOI (None when
+    Crossref does not know the DOI) and the DOIs whose lookup failed.
+
+    DOIs with a revalidatable cache entry go through crossref_lookup (usually a
+    cheap 304); the rest are fetched _BATCH_SIZE at a time. Filter responses
+    carry no per-work ETag/Last-Modified, so batched works are not cached:
+    for those DOIs batching replaces revalidation. Only single lookups (cache
+    hits, or fallbacks for DOIs a batch missed) read or write the cache.
+    Commas would break the filter syntax, so such DOIs are always looked up
+    singly.
+    """
+    # single DOIs carry their cache entry so crossref_lookup need not re-read it
+    single: list[tuple[str, dict[str, Any] | None]] = []
+    batched: list[str] = []
+    seen: set[str] = set()
+    for doi in dois:
+        if doi.lower() in seen:
+            continue
+        seen.add(doi.lower())
+        cached = _read_cache(doi)
+        if _has_validators(cached):
+            single.append((doi, cached))
+        elif "," in doi:
+            # an entry without validators cannot produce a 304; don't pass it
+            single.append((doi, None))
+        else:
+            batched.append(doi)
+
+    msgs: dict[str, dict[str, Any] | None] = {}
+    failed: list[str] = []
+    # max_workers caps in-flight requests; the pacers cap the request rate
+    with ThreadPoolExecutor(max_workers=_MAX_WORKERS) as ex:
+        single_futures = {ex.submit(crossref_lookup, d, c): d for d, c in single}
+        chunks = [batched[i : i + _BATCH_SIZE] for i in range(0, len(batched), _BATCH_SIZE)]
+        chunk_futures = {ex.submit(_lookup_chunk, c): c for c in chunks}
+        for fut, doi in single_futures.items():
+            try:
+                msgs[doi.lower()] = fut.result()
+            except _LOOKUP_ERRORS:
+                failed.append(doi)
+        for fut, chunk in chunk_futures.items():
+            try:
+                chunk_msgs, chunk_failed = fut.result()
+            except _LOOKUP_ERRORS:
+                failed.extend(chunk)
+                continue
+            msgs.update(chunk_msgs)
+            failed.extend(chunk_failed)
+    return msgs, failed
 
 
 def cr_get_first(msg: dict[str, Any], field: str) -> str:
@@ -151,13 +345,26 @@ def compare(item: BibItem, msg: dict[str, Any]) -> dict[str, tuple[str, str]]:
     return diffs
 
 
-def build_report(diffs_by_key: dict[str, dict[str, tuple[str, str]]]) -> str:
+def build_report(
+    diffs_by_key: dict[str, dict[str, tuple[str, str]]],
+    failed: list[BibItem] | None = None,
+) -> str:
     lines: list[str] = []
     lines.append("# Metadata watch report\n")
     lines.append(f"Generated: **{date.today().isoformat()}**\n")
 
+    if failed:
+        # these were not checked at all; never report them as matching
+        lines.append(f"Crossref lookup failed for **{len(failed)}** item(s); they were not checked.\n")
+        for it in failed:
+            lines.append(f"- `{it.key}` (`{it.doi}`)")
+        lines.append("")
+
     if not diffs_by_key:
-        lines.append("No differences detected vs Crossref.\n")
+        if failed:
+            lines.append("No differences detected among the items that were checked.\n")
+        else:
+            lines.append("No differences detected vs Crossref.\n")
         return "\n".join(lines)
 
     lines.append(f"Found differences for **{len(diffs_by_key)}** item(s).\n")
@@ -179,19 +386,26 @@ def main() -> int:
     items = load_bib(bib_path)
     diffs_by_key: dict[str, dict[str, tuple[str, str]]] = {}
 
+    msgs, failed_dois = lookup_all([it.doi for it in items])
+    failed_set = {d.lower() for d in failed_dois}
+    failed = [it for it in items if it.doi.lower() in failed_set]
+
+    # keep report order stable (bib order), independent of completion order
     for it in items:
-        msg = crossref_lookup(it.doi)
+        msg = msgs.get(it.doi.lower())
         if not msg:
             continue
         diffs = compare(it, msg)
         if diffs:
             diffs_by_key[it.key] = diffs
 
-    report = build_report(diffs_by_key)
+    report = build_report(diffs_by_key, failed)
     out_path.write_text(report + "\n", encoding="utf-8")
 
-    # Exit code 1 means "diffs found"
-    return 1 if diffs_by_key else 0
+    # Exit code 1 means "diffs found", 2 means "no diffs, but some lookups failed"
+    if diffs_by_key:
+        return 1
+    return 2 if failed else 0
 
 
 if __name__ == "__main__":
@@ -0,0 +1 @@
+"""Helpers shared by build_publications.py and check_metadata.py."""
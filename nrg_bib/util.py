@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import re
+from typing import Any
+
+DOI_RE = re.compile(r"10\.\d{4,9}/[^\s\"<>]+", re.I)
+_YEAR_RE = re.compile(r"\b(19|20)\d{2}\b")
+
+
+def _clean(s: str | None) -> str:
+    return (s or "").strip()
+
+
+def _first_doi(s: str | None) -> str | None:
+    s = _clean(s)
+    if not s:
+        return None
+    m = DOI_RE.search(s)
+    return m.group(0) if m else None
+
+
+def _parse_year(s: str | None) -> int:
+    s = _clean(s)
+    m = _YEAR_RE.search(s)
+    return int(m.group(0)) if m else 0
+
+
+def _normalize_pages(pages: str | None) -> str:
+    pages = _clean(pages)
+    if not pages:
+        return ""
+    # BibTeX page ranges use double hyphen
+    return pages.replace("--", "-")
+    # If you prefer en dash: return pages.replace("--", "–")
+
+
+def _bib_fields(block: Any) -> dict[str, Any]:
+    """
+    Flatten a bibtexparser v2 entry into the plain dict shape both scripts
+    read (field name -> value, plus ID/ENTRYTYPE).
+    """
+    fields = {f.key: f.value for f in block.fields}
+    fields["ID"] = block.key
+    fields["ENTRYTYPE"] = block.entry_type
+    return fields
+
+
+def _failed_blocks(library: Any) -> list[str]:
+    """
+    Describe every block bibtexparser v2 could not turn into an entry
+    (duplicate keys, syntax errors, ...), one line each. These never show up in
+    library.entries, so callers must not ignore them.
+    """
+    out: list[str] = []
+    for block in library.failed_blocks:
+        # start_line is 0-based
+        line = (block.start_line or 0) + 1
+        key = getattr(block, "key", None) or _clean(block.raw).split(",", 1)[0]
+        error = getattr(block, "error", None)
+        # syntax errors carry their message in abort_reason, not str(error)
+        reason = _clean(getattr(error, "abort_reason", None) or str(error or ""))
+        reason = reason.splitlines()[0] if reason else type(block).__name__
+        out.append(f"line {line}: {key}: {reason}")
+    return out